@@ -20,8 +20,10 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
+from math import radians, sin, cos, sqrt, atan2
 import re
-from typing import Tuple, Optional, List
+from typing import Tuple, Optional, List, Sequence
 
 # Paths
 DATA_DIR = Path(__file__).parent / "data"
@@ -34,6 +36,38 @@ PARKRUN_FEATURES = DATA_DIR / "parkrun_classifier_features.csv"
 EVENT_FEATURES = DATA_DIR / "event_predictor_features.csv"
 FEATURE_INFO = DATA_DIR / "feature_info.json"
 
+EARTH_RADIUS_KM = 6371
+
+# Activity-name patterns (matched against the lowercased name) for each text feature
+TEXT_FEATURE_PATTERNS = {
+    'contains_parkrun': re.compile(r'park ?run'),
+    'contains_marathon': re.compile(r'marathon'),
+    'contains_half': re.compile(r'half'),
+    'contains_ultra': re.compile(r'ultra'),
+    'contains_fun_run': re.compile(r'fun ?run'),
+}
+
+# PyArrow's multithreaded CSV reader is much faster than pandas' default parser
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+# Compact dtypes for engineered features (see downcast_feature_dtypes)
+INT8_FEATURES = {
+    'day_of_week', 'hour', 'month',
+    'is_5k', 'is_10k', 'is_half_marathon', 'is_marathon', 'is_ultra', 'is_loop',
+}
+INT8_FEATURE_PREFIXES = ('contains_', 'day_', 'hour_')
+INT32_FEATURES = {'coord_count', 'name_length'}
+
+# Numba is optional: when installed, Haversine + loop detection run as one compiled pass
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 # We'll need polyline library for decoding GPS data
 try:
     import polyline
@@ -43,12 +77,18 @@ except ImportError:
     polyline = None
 
 
-def decode_polyline(polyline_str: Optional[str]) -> Optional[List[Tuple[float, float]]]:
-    """Decode Strava polyline to list of (lat, lng) coordinates"""
-    if not polyline_str or not polyline:
+@lru_cache(maxsize=4096)
+def _decode_polyline_cached(polyline_str: str) -> Tuple[Tuple[float, float], ...]:
+    """Decode a polyline once per distinct string (recurring courses share polylines)"""
+    return tuple(polyline.decode(polyline_str))
+
+
+def decode_polyline(polyline_str: Optional[str]) -> Optional[Sequence[Tuple[float, float]]]:
+    """Decode Strava polyline to a sequence of (lat, lng) coordinates"""
+    if not isinstance(polyline_str, str) or not polyline_str or not polyline:
         return None
     try:
-        return polyline.decode(polyline_str)
+        return _decode_polyline_cached(polyline_str)
     except Exception as e:
         return None
 
@@ -89,15 +129,7 @@ def extract_geolocation_features(polyline_str: Optional[str]) -> dict:
     features['coord_count'] = len(coords)
 
     # Calculate straight-line distance using Haversine formula
-    # Simple approximation for short distances
-    lat_diff = abs(end_lat - start_lat)
-    lng_diff = abs(end_lng - start_lng)
-
-    # Rough approximation: 1 degree ≈ 111km at equator
-    # More accurate: use Haversine
-    from math import radians, sin, cos, sqrt, atan2
-
-    R = 6371  # Earth radius in km
+    R = EARTH_RADIUS_KM
     lat1, lng1 = radians(start_lat), radians(start_lng)
     lat2, lng2 = radians(end_lat), radians(end_lng)
 
@@ -114,30 +146,97 @@ def extract_geolocation_features(polyline_str: Optional[str]) -> dict:
     return features
 
 
-def extract_text_features(activity_name: str) -> dict:
+def haversine_km(start_lat, start_lng, end_lat, end_lng) -> np.ndarray:
+    """Haversine distance (km) between start and end coordinates, element-wise over arrays"""
+    lat1, lng1 = np.radians(start_lat), np.radians(start_lng)
+    lat2, lng2 = np.radians(end_lat), np.radians(end_lng)
+
+    dlat = lat2 - lat1
+    dlng = lng2 - lng1
+
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlng/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+    return EARTH_RADIUS_KM * c
+
+
+def _haversine_loop_kernel(starts, ends, out_dist, out_loop):
+    """Fused per-row Haversine distance and loop flag (compiled with numba when available)"""
+    for i in prange(starts.shape[0]):
+        lat1, lng1 = radians(starts[i, 0]), radians(starts[i, 1])
+        lat2, lng2 = radians(ends[i, 0]), radians(ends[i, 1])
+        a = sin((lat2 - lat1)/2)**2 + cos(lat1) * cos(lat2) * sin((lng2 - lng1)/2)**2
+        distance = EARTH_RADIUS_KM * 2 * atan2(sqrt(a), sqrt(1-a))
+        out_dist[i] = distance
+        out_loop[i] = 1 if distance < 0.1 else 0
+
+
+if njit is not None:
+    _haversine_loop_kernel = njit(parallel=True, cache=True)(_haversine_loop_kernel)
+else:
+    _haversine_loop_kernel = None
+
+
+def extract_geolocation_features_batch(coords_list: List[Sequence[Tuple[float, float]]]) -> dict:
     """
-    Extract text features from activity name
+    Vectorized version of extract_geolocation_features for many decoded polylines
+
+    Args:
+        coords_list: Non-empty decoded coordinate lists, one per activity
 
     Returns:
-    - contains_parkrun: 1 if "parkrun" in name
-    - contains_marathon: 1 if "marathon" in name
-    - contains_half: 1 if "half" in name
-    - contains_ultra: 1 if "ultra" in name
-    - contains_fun_run: 1 if "fun run" in name
-    - name_length: Length of activity name
+        Dict of numpy arrays keyed by the same feature names as extract_geolocation_features
     """
-    name_lower = activity_name.lower() if activity_name else ""
+    starts = np.array([coords[0] for coords in coords_list], dtype=np.float64).reshape(-1, 2)
+    ends = np.array([coords[-1] for coords in coords_list], dtype=np.float64).reshape(-1, 2)
+
+    if _haversine_loop_kernel is not None:
+        distance = np.empty(len(starts))
+        is_loop = np.empty(len(starts), dtype=np.int8)
+        _haversine_loop_kernel(starts, ends, distance, is_loop)
+    else:
+        distance = haversine_km(starts[:, 0], starts[:, 1], ends[:, 0], ends[:, 1])
+        is_loop = (distance < 0.1).astype(np.int8)  # Loop if < 100m
 
     return {
-        'contains_parkrun': 1 if 'parkrun' in name_lower or 'park run' in name_lower else 0,
-        'contains_marathon': 1 if 'marathon' in name_lower else 0,
-        'contains_half': 1 if 'half' in name_lower else 0,
-        'contains_ultra': 1 if 'ultra' in name_lower else 0,
-        'contains_fun_run': 1 if 'fun run' in name_lower or 'funrun' in name_lower else 0,
-        'name_length': len(activity_name) if activity_name else 0,
+        'start_lat': starts[:, 0],
+        'start_lng': starts[:, 1],
+        'end_lat': ends[:, 0],
+        'end_lng': ends[:, 1],
+        'distance_start_to_end_km': distance,
+        'is_loop': is_loop,
+        'coord_count': np.array([len(coords) for coords in coords_list], dtype=np.int32),
     }
 
 
+def downcast_feature_dtypes(df: pd.DataFrame, feature_cols: List[str]) -> pd.DataFrame:
+    """
+    Cast feature columns to the smallest dtype that holds them
+
+    - Binary flags, one-hots and small calendar fields -> int8
+    - coord_count, name_length -> int32
+    - Everything else (distances, pace, coordinates) -> float32
+
+    Columns containing missing values stay floating point.
+    """
+    dtypes = {}
+    for col in df.columns.unique():
+        if col not in feature_cols:
+            continue
+        values = df.loc[:, df.columns == col]
+        if not all(pd.api.types.is_numeric_dtype(t) or pd.api.types.is_bool_dtype(t) for t in values.dtypes):
+            continue
+
+        has_missing = values.isna().to_numpy().any()
+        if col in INT32_FEATURES and not has_missing:
+            dtypes[col] = np.int32
+        elif (col in INT8_FEATURES or col.startswith(INT8_FEATURE_PREFIXES)) and not has_missing:
+            dtypes[col] = np.int8
+        else:
+            dtypes[col] = np.float32
+
+    return df.astype(dtypes)
+
+
 def engineer_features(df: pd.DataFrame, include_event_name: bool = False) -> pd.DataFrame:
     """
     Engineer all features from raw race data
@@ -151,8 +250,8 @@ def engineer_features(df: pd.DataFrame, include_event_name: bool = False) -> pd.
     """
     print(f"🔧 Engineering features for {len(df)} races...")
 
-    # Make a copy to avoid modifying original
-    features_df = df.copy()
+    # Shallow copy: new columns are added to the copy without duplicating the input blocks
+    features_df = df.copy(deep=False)
 
     # 1. Time-based features (already computed in process_all_data.py)
     # Ensure these exist
@@ -171,57 +270,69 @@ def engineer_features(df: pd.DataFrame, include_event_name: bool = False) -> pd.
     if 'pace_min_per_km' not in features_df.columns:
         features_df['pace_min_per_km'] = (features_df['final_time'] / 60) / features_df['distance_km']
 
+    # Derived columns are collected here and assigned in one step
+    derived = {}
+
     # 4. Text features from activity name
     print("   Extracting text features from activity names...")
-    text_features = features_df['activity_name'].apply(extract_text_features)
-    text_features_df = pd.DataFrame(text_features.tolist())
-    features_df = pd.concat([features_df, text_features_df], axis=1)
+    names = features_df['activity_name'].fillna('').str.lower()
+    for col, pattern in TEXT_FEATURE_PATTERNS.items():
+        derived[col] = names.str.contains(pattern).to_numpy(np.int8)
+    derived['name_length'] = features_df['activity_name'].str.len().fillna(0).to_numpy(np.int32)
 
     # 5. Geolocation features from polylines
-    if polyline and 'polyline' in features_df.columns:
+    has_polylines = 'polyline' in features_df.columns and features_df['polyline'].notna().any()
+    if polyline and has_polylines:
         print("   Extracting geolocation features from polylines...")
-        # This might take a while, so we'll do it in batches
-        geo_features = []
-        for idx, row in features_df.iterrows():
-            if idx % 100 == 0:
-                print(f"      Processing polyline {idx}/{len(features_df)}...")
-
-            # Get polyline from database (need to query it)
-            # For now, we'll skip polyline extraction and handle it separately
-            # since our CSV doesn't include the actual polyline string
-            geo_features.append(extract_geolocation_features(None))
-
-        geo_features_df = pd.DataFrame(geo_features)
-        features_df = pd.concat([features_df, geo_features_df], axis=1)
+        # Decode first, then compute Haversine for all activities in one pass
+        decoded = features_df['polyline'].map(decode_polyline)
+        coord_count = decoded.map(lambda coords: len(coords) if coords else 0).to_numpy()
+        mask = coord_count > 0
+        print(f"      Decoded {mask.sum()}/{len(features_df)} polylines")
+
+        geo_features = extract_geolocation_features_batch(decoded[mask].tolist())
+
+        for col, values in geo_features.items():
+            if col == 'coord_count':
+                derived[col] = coord_count.astype(np.int32)
+                continue
+            column = np.full(len(features_df), np.nan)
+            column[mask] = values
+            derived[col] = column
     else:
-        print("   ⚠️  Skipping polyline features (not available in CSV)")
+        print("   ⚠️  Skipping polyline features (no polylines available)")
         # Add placeholder columns
-        features_df['start_lat'] = None
-        features_df['start_lng'] = None
-        features_df['end_lat'] = None
-        features_df['end_lng'] = None
-        features_df['distance_start_to_end_km'] = None
-        features_df['is_loop'] = None
-        features_df['coord_count'] = 0
-
-    # 6. Categorical encoding for day of week (one-hot)
-    day_dummies = pd.get_dummies(features_df['day_of_week'], prefix='day')
-    features_df = pd.concat([features_df, day_dummies], axis=1)
+        for col in ['start_lat', 'start_lng', 'end_lat', 'end_lng', 'distance_start_to_end_km', 'is_loop']:
+            derived[col] = None
+        derived['coord_count'] = 0
+
+    # 6. Categorical encoding for day of week (one-hot, always all 7 days)
+    # A missing day (unparseable date) gets an all-zero row
+    dow = features_df['day_of_week'].fillna(-1).to_numpy(np.int8)
+    day_one_hot = np.zeros((len(dow), 7), dtype=np.int8)
+    rows = np.flatnonzero((dow >= 0) & (dow < 7))
+    day_one_hot[rows, dow[rows]] = 1
+    for i in range(7):
+        derived[f'day_{i}'] = day_one_hot[:, i]
 
     # 7. Categorical encoding for hour (one-hot for common race hours)
     # Most races happen 6am-10am, so we'll group others
-    features_df['hour_binned'] = features_df['hour'].apply(
-        lambda h: h if 6 <= h <= 10 else 'other'
-    )
-    hour_dummies = pd.get_dummies(features_df['hour_binned'], prefix='hour')
-    features_df = pd.concat([features_df, hour_dummies], axis=1)
+    hours = features_df['hour'].fillna(-1).to_numpy(np.int8)  # missing hour -> 'other'
+    hour_bucket = np.where((hours >= 6) & (hours <= 10), hours - 6, 5)  # 0-4 = 6am-10am, 5 = other
+    hour_one_hot = np.zeros((len(hours), 6), dtype=np.int8)
+    hour_one_hot[np.arange(len(hours)), hour_bucket] = 1
+    for i, col in enumerate(['hour_6', 'hour_7', 'hour_8', 'hour_9', 'hour_10', 'hour_other']):
+        derived[col] = hour_one_hot[:, i]
 
     # 8. Distance category features
-    features_df['is_5k'] = ((features_df['distance_km'] >= 4.5) & (features_df['distance_km'] <= 5.5)).astype(int)
-    features_df['is_10k'] = ((features_df['distance_km'] >= 9.5) & (features_df['distance_km'] <= 10.5)).astype(int)
-    features_df['is_half_marathon'] = ((features_df['distance_km'] >= 20) & (features_df['distance_km'] <= 22)).astype(int)
-    features_df['is_marathon'] = ((features_df['distance_km'] >= 40) & (features_df['distance_km'] <= 43)).astype(int)
-    features_df['is_ultra'] = (features_df['distance_km'] > 43).astype(int)
+    distance_km = features_df['distance_km'].to_numpy()
+    derived['is_5k'] = ((distance_km >= 4.5) & (distance_km <= 5.5)).astype(int)
+    derived['is_10k'] = ((distance_km >= 9.5) & (distance_km <= 10.5)).astype(int)
+    derived['is_half_marathon'] = ((distance_km >= 20) & (distance_km <= 22)).astype(int)
+    derived['is_marathon'] = ((distance_km >= 40) & (distance_km <= 43)).astype(int)
+    derived['is_ultra'] = (distance_km > 43).astype(int)
+
+    features_df = features_df.assign(**derived)
 
     # Select feature columns for model
     feature_cols = [
@@ -289,6 +400,12 @@ def engineer_features(df: pd.DataFrame, include_event_name: bool = False) -> pd.
         print(f"   ⚠️  Dropping object columns: {list(object_cols)}")
         result = result.drop(columns=object_cols)
 
+    # Narrow feature dtypes (int8 flags, float32 measurements) to halve memory traffic
+    memory_before = result.memory_usage(deep=False).sum()
+    result = downcast_feature_dtypes(result, feature_cols)
+    memory_after = result.memory_usage(deep=False).sum()
+    print(f"   Downcast feature dtypes: {memory_before/1024:.0f}KB -> {memory_after/1024:.0f}KB")
+
     print(f"✅ Feature engineering complete!")
     print(f"   Total features: {len(feature_cols)}")
     print(f"   Records: {len(result)}")
@@ -341,7 +458,7 @@ def main():
         print("   Run process_all_data.py first!")
         return 1
 
-    all_races = pd.read_csv(ALL_RACES_CSV)
+    all_races = pd.read_csv(ALL_RACES_CSV, engine=CSV_ENGINE)
     print(f"   Loaded {len(all_races)} total races")
 
     # 1. Create features for Parkrun Binary Classifier
@@ -360,7 +477,7 @@ def main():
     print("2️⃣  EVENT NAME PREDICTOR FEATURES")
     print("="*60 + "\n")
 
-    non_parkruns = all_races[~all_races['is_parkrun']].copy()
+    non_parkruns = all_races[~all_races['is_parkrun']]
     print(f"   Filtering to {len(non_parkruns)} non-parkrun events...")
 
     event_features = engineer_features(non_parkruns, include_event_name=True)
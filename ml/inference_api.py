@@ -9,16 +9,25 @@ Workers will call this API with race features.
 Usage:
   uvicorn inference_api:app --reload
 
+Production (one process per core, models loaded once per worker):
+  uvicorn inference_api:app --workers 2 --loop uvloop --http httptools
+
 Deploy to Railway:
   railway init
   railway up
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
+import asyncio
+import os
+from contextlib import asynccontextmanager
 import pickle
 import numpy as np
+import xgboost as xgb
+from itertools import chain
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 import logging
@@ -29,25 +38,166 @@ logger = logging.getLogger(__name__)
 
 # Paths
 MODELS_DIR = Path(__file__).parent / "models"
-PARKRUN_MODEL = MODELS_DIR / "parkrun_classifier_simple.pkl"
+PARKRUN_MODEL = MODELS_DIR / "parkrun_classifier_simple.ubj"
+PARKRUN_MODEL_PICKLE = MODELS_DIR / "parkrun_classifier_simple.pkl"  # older training runs
 EVENT_MODEL = MODELS_DIR / "event_predictor.pkl"
-LABEL_ENCODER = MODELS_DIR / "event_predictor_label_encoder.pkl"
-
-# Load models at startup
-logger.info("Loading models...")
-with open(PARKRUN_MODEL, 'rb') as f:
-    parkrun_model = pickle.load(f)
-with open(EVENT_MODEL, 'rb') as f:
-    event_model = pickle.load(f)
-with open(LABEL_ENCODER, 'rb') as f:
-    label_encoder = pickle.load(f)
-logger.info("Models loaded successfully!")
+EVENT_CLASSES = MODELS_DIR / "event_predictor_classes.npy"
+LABEL_ENCODER = MODELS_DIR / "event_predictor_label_encoder.pkl"  # older training runs
+
+# Dynamic micro-batching: concurrent requests are coalesced into one predict_proba call
+MAX_BATCH = int(os.environ.get("MAX_BATCH", "32"))
+BATCH_TIMEOUT_MS = float(os.environ.get("BATCH_TIMEOUT_MS", "5"))
+
+
+def load_pickle(path: Path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def load_classifier(path: Path) -> xgb.XGBClassifier:
+    """Load an XGBClassifier saved in XGBoost's native format"""
+    model = xgb.XGBClassifier()
+    model.load_model(path)
+    return model
+
+
+class BoosterPredictor:
+    """
+    Runs an XGBoost booster (bare, or an XGBClassifier's) directly on float32 feature matrices
+
+    Skips the sklearn wrapper's DMatrix construction and validation on every call,
+    and pins the booster to one thread: parallelism comes from batching concurrent
+    requests, not from splitting a handful of rows across cores.
+    """
+
+    def __init__(self, model):
+        # Older training runs pickled the XGBClassifier wrapper, newer ones just the Booster
+        booster = model.get_booster() if isinstance(model, xgb.XGBClassifier) else model
+        self.booster = booster.copy()
+        self.booster.set_param({"nthread": 1})
+        try:
+            self.iteration_range = (0, model.best_iteration + 1)
+        except AttributeError:
+            self.iteration_range = (0, 0)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        probabilities = self.booster.inplace_predict(
+            X, iteration_range=self.iteration_range, validate_features=False
+        )
+        if probabilities.ndim == 1:
+            # binary:logistic returns P(class 1) only
+            probabilities = np.column_stack([1 - probabilities, probabilities])
+        return probabilities
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-row predictions into batched predict_proba calls
+
+    Requests queue a feature row and await a future. A background task collects
+    up to MAX_BATCH rows (waiting at most BATCH_TIMEOUT_MS after the first one),
+    writes them into a preallocated float32 matrix and runs the model once in a
+    worker thread. Batches are processed one at a time, so the matrix is reused.
+    """
+
+    def __init__(self, model, num_features: int):
+        self.model = model
+        self.buffer = np.empty((MAX_BATCH, num_features), dtype=np.float32)
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def predict_proba(self, row: tuple) -> np.ndarray:
+        """Return class probabilities for a single feature row (in model feature order)"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((row, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + BATCH_TIMEOUT_MS / 1000
+            while len(batch) < MAX_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            # A row that can't be stored as float32 (e.g. a huge integer) fails
+            # only its own request; the rest of the batch still runs
+            futures = []
+            for row, future in batch:
+                try:
+                    self.buffer[len(futures)] = row
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                futures.append(future)
+            if not futures:
+                continue
+
+            try:
+                probabilities = await asyncio.to_thread(self.model.predict_proba, self.buffer[:len(futures)])
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for future, row_probabilities in zip(futures, probabilities):
+                if not future.done():
+                    future.set_result(row_probabilities)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Load models once per worker process at boot and start the batchers"""
+    logger.info("Loading models...")
+    if PARKRUN_MODEL.exists():
+        parkrun_model = load_classifier(PARKRUN_MODEL)
+    else:
+        parkrun_model = load_pickle(PARKRUN_MODEL_PICKLE)
+    event_model = load_pickle(EVENT_MODEL)
+    # Plain list: indexing it per request avoids numpy object-array scalar boxing
+    if EVENT_CLASSES.exists():
+        app.state.event_classes = np.load(EVENT_CLASSES).tolist()
+    else:
+        app.state.event_classes = load_pickle(LABEL_ENCODER).classes_.tolist()
+    logger.info("Models loaded successfully!")
+
+    parkrun_predictor = BoosterPredictor(parkrun_model)
+    app.state.event_predictor = BoosterPredictor(event_model)
+
+    # Pay first-call costs here rather than on the first real request
+    parkrun_predictor.predict_proba(np.zeros((1, 10), dtype=np.float32))
+    app.state.event_predictor.predict_proba(np.zeros((1, 32), dtype=np.float32))
+    logger.info("Models pre-warmed")
+
+    app.state.parkrun_batcher = MicroBatcher(parkrun_predictor, num_features=10)
+    app.state.event_batcher = MicroBatcher(app.state.event_predictor, num_features=32)
+    app.state.parkrun_batcher.start()
+    app.state.event_batcher.start()
+
+    yield
+
+    app.state.parkrun_batcher.task.cancel()
+    app.state.event_batcher.task.cancel()
+
 
 # FastAPI app
 app = FastAPI(
     title="Race Classification API",
     description="ML inference for parkrun detection and event prediction",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS for Cloudflare Workers
@@ -117,6 +267,49 @@ class EventFeatures(BaseModel):
     hour_other: Optional[int] = 0  # For hours not in 6-10 range
 
 
+def event_feature_row(features: EventFeatures) -> tuple:
+    """
+    Feature row for the event predictor (32 features in correct order)
+
+    This order MUST match the training order from feature_engineering.py
+    Note: coord_count is included but always 0 (polylines not decoded during training)
+    """
+    return (
+        features.distance_km,
+        features.pace_min_per_km,
+        features.elevation_gain,
+        features.day_of_week,
+        features.hour,
+        features.month,
+        features.contains_parkrun,
+        features.contains_marathon,
+        features.contains_half,
+        features.contains_ultra,
+        features.contains_fun_run,
+        features.name_length,
+        features.is_5k,
+        features.is_10k,
+        features.is_half_marathon,
+        features.is_marathon,
+        features.is_ultra,
+        0,  # coord_count (always 0, polylines not decoded)
+        0,  # day_of_week.1 (artifact from pandas one-hot encoding, always 0)
+        features.day_0,
+        features.day_1,
+        features.day_2,
+        features.day_3,
+        features.day_4,
+        features.day_5,
+        features.day_6,
+        features.hour_6,
+        features.hour_7,
+        features.hour_8,
+        features.hour_9,
+        features.hour_10,
+        features.hour_other,
+    )
+
+
 class ParkrunPrediction(BaseModel):
     is_parkrun: bool
     probability: float
@@ -130,6 +323,81 @@ class EventPrediction(BaseModel):
     model: str = "event_predictor"
 
 
+class BatchEventRequest(BaseModel):
+    races: List[EventFeatures]
+
+
+class BatchEventPrediction(BaseModel):
+    results: List[EventPrediction]
+
+
+def top_3_indices(probabilities: np.ndarray) -> np.ndarray:
+    """
+    Indices of the 3 most probable classes along the last axis, highest first
+
+    Partitions out the top 3 in O(C) instead of sorting all C classes, then
+    orders just those 3. Works on a single row or an (N, C) batch.
+    """
+    k = min(3, probabilities.shape[-1])
+    top_k = np.argpartition(-probabilities, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(probabilities, top_k, axis=-1), axis=-1)
+    return np.take_along_axis(top_k, order, axis=-1)
+
+
+def event_prediction(probabilities: np.ndarray, top_3_indices: np.ndarray, classes: List[str]) -> EventPrediction:
+    """Build the response for one race from its class probabilities and top 3 class indices"""
+    top_3 = [
+        {
+            "event_name": str(classes[idx]),
+            "probability": float(probabilities[idx])
+        }
+        for idx in top_3_indices.tolist()
+    ]
+
+    # Top prediction is the first of the top 3; convert to string, handle NaN
+    prediction = int(top_3_indices[0])
+    predicted_event = str(classes[prediction])
+    if predicted_event == 'nan':
+        predicted_event = "Unknown Event"
+
+    return EventPrediction(
+        event_name=predicted_event,
+        probability=float(probabilities[prediction]),
+        top_3=top_3
+    )
+
+
+async def parse_body(request: Request, model):
+    """
+    Validate the raw JSON body straight into a pydantic model
+
+    pydantic-core parses the bytes in one pass, skipping FastAPI's json.loads
+    into a dict followed by a second validation pass over it.
+    """
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Same error shape FastAPI returns for body validation failures
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)
+        ])
+
+
+def json_response(prediction: BaseModel) -> Response:
+    """Serialize a response model directly, skipping re-validation and jsonable_encoder"""
+    return Response(content=prediction.model_dump_json(), media_type="application/json")
+
+
+def json_body(model) -> Dict[str, Any]:
+    """OpenAPI request body for endpoints that parse their body with parse_body"""
+    return {
+        "requestBody": {
+            "content": {"application/json": {"schema": model.model_json_schema()}},
+            "required": True,
+        }
+    }
+
+
 @app.get("/")
 async def root():
     """Health check"""
@@ -149,8 +417,8 @@ async def health():
     return {"status": "healthy"}
 
 
-@app.post("/predict/parkrun", response_model=ParkrunPrediction)
-async def predict_parkrun(features: ParkrunFeatures):
+@app.post("/predict/parkrun", response_model=ParkrunPrediction, openapi_extra=json_body(ParkrunFeatures))
+async def predict_parkrun(request: Request):
     """
     Predict if a race is a parkrun
 
@@ -158,9 +426,11 @@ async def predict_parkrun(features: ParkrunFeatures):
         - is_parkrun: boolean prediction
         - probability: confidence score (0-1)
     """
+    features = await parse_body(request, ParkrunFeatures)
+
     try:
-        # Convert features to numpy array in correct order
-        X = np.array([[
+        # Feature row in the order the model was trained on
+        row = (
             features.contains_parkrun,
             features.is_5k,
             features.hour_8,
@@ -171,24 +441,23 @@ async def predict_parkrun(features: ParkrunFeatures):
             features.day_5,
             features.pace_min_per_km,
             features.day_of_week,
-        ]], dtype=np.float32)
+        )
 
-        # Predict
-        prediction = parkrun_model.predict(X)[0]
-        probability = parkrun_model.predict_proba(X)[0][1]  # Probability of class 1 (parkrun)
+        # Predict (batched with concurrent requests)
+        probability = (await request.app.state.parkrun_batcher.predict_proba(row))[1]  # Probability of class 1 (parkrun)
 
-        return ParkrunPrediction(
-            is_parkrun=bool(prediction == 1),
+        return json_response(ParkrunPrediction(
+            is_parkrun=bool(probability > 0.5),
             probability=float(probability)
-        )
+        ))
 
     except Exception as e:
         logger.error(f"Error in parkrun prediction: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/predict/event", response_model=EventPrediction)
-async def predict_event(features: EventFeatures):
+@app.post("/predict/event", response_model=EventPrediction, openapi_extra=json_body(EventFeatures))
+async def predict_event(request: Request):
     """
     Predict the event name for a race
 
@@ -197,90 +466,50 @@ async def predict_event(features: EventFeatures):
         - probability: confidence score for top prediction
         - top_3: list of top 3 predictions with probabilities
     """
+    features = await parse_body(request, EventFeatures)
+
     try:
-        # Convert features to numpy array (32 features in correct order)
-        # This order MUST match the training order from feature_engineering.py
-        # Note: coord_count is included but always 0 (polylines not decoded during training)
-        X = np.array([[
-            features.distance_km,
-            features.pace_min_per_km,
-            features.elevation_gain,
-            features.day_of_week,
-            features.hour,
-            features.month,
-            features.contains_parkrun,
-            features.contains_marathon,
-            features.contains_half,
-            features.contains_ultra,
-            features.contains_fun_run,
-            features.name_length,
-            features.is_5k,
-            features.is_10k,
-            features.is_half_marathon,
-            features.is_marathon,
-            features.is_ultra,
-            0,  # coord_count (always 0, polylines not decoded)
-            0,  # day_of_week.1 (artifact from pandas one-hot encoding, always 0)
-            features.day_0,
-            features.day_1,
-            features.day_2,
-            features.day_3,
-            features.day_4,
-            features.day_5,
-            features.day_6,
-            features.hour_6,
-            features.hour_7,
-            features.hour_8,
-            features.hour_9,
-            features.hour_10,
-            features.hour_other,
-        ]], dtype=np.float32)
-
-        # Predict
-        prediction = event_model.predict(X)[0]
-        probabilities = event_model.predict_proba(X)[0]
-
-        # Get top 3 predictions
-        top_3_indices = np.argsort(probabilities)[-3:][::-1]
-        top_3 = [
-            {
-                "event_name": str(label_encoder.classes_[idx]),
-                "probability": float(probabilities[idx])
-            }
-            for idx in top_3_indices
-        ]
-
-        # Convert predicted class to string, handle NaN
-        predicted_event = str(label_encoder.classes_[prediction])
-        if predicted_event == 'nan':
-            predicted_event = "Unknown Event"
-
-        return EventPrediction(
-            event_name=predicted_event,
-            probability=float(probabilities[prediction]),
-            top_3=top_3
-        )
+        row = event_feature_row(features)
+
+        # Predict (batched with concurrent requests)
+        probabilities = await request.app.state.event_batcher.predict_proba(row)
+
+        classes = request.app.state.event_classes
+        return json_response(event_prediction(probabilities, top_3_indices(probabilities), classes))
 
     except Exception as e:
         logger.error(f"Error in event prediction: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/predict/batch")
-async def predict_batch(races: List[Dict]):
+@app.post("/predict/batch", response_model=BatchEventPrediction)
+def predict_batch(batch: BatchEventRequest, request: Request):
     """
-    Batch prediction for multiple races
+    Batch event prediction for multiple races
 
-    This is more efficient than individual API calls.
+    This is more efficient than individual API calls: all races are stacked
+    into one (N, 32) float32 matrix and scored with a single predict call.
+    Declared sync so FastAPI runs the whole CPU-bound handler in its threadpool
+    instead of on the event loop (single-race endpoints go through the batchers).
     """
     try:
-        results = []
-        for race in races:
-            # Extract features and predict
-            # Implementation depends on your needs
-            pass
+        n = len(batch.races)
+        if n == 0:
+            return BatchEventPrediction(results=[])
+
+        X = np.fromiter(
+            chain.from_iterable(event_feature_row(race) for race in batch.races),
+            dtype=np.float32,
+            count=n * 32
+        ).reshape(n, 32)
+
+        probabilities = request.app.state.event_predictor.predict_proba(X)
 
-        return {"results": results}
+        classes = request.app.state.event_classes
+        return BatchEventPrediction(results=[
+            event_prediction(row_probabilities, row_top_3, classes)
+            for row_probabilities, row_top_3 in zip(probabilities, top_3_indices(probabilities))
+        ])
 
     except Exception as e:
         logger.error(f"Error in batch prediction: {e}")
@@ -289,4 +518,12 @@ async def predict_batch(races: List[Dict]):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Each worker is a separate process with its own copy of the models (WEB_CONCURRENCY sets the count)
+    uvicorn.run(
+        "inference_api:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.environ.get("WEB_CONCURRENCY", "2")),
+        loop="uvloop",
+        http="httptools"
+    )
@@ -6,10 +6,26 @@ Converts JSON to CSV and generates comprehensive statistics
 """
 
 import json
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from datetime import datetime
 
+# orjson parses the wrangler dump several times faster than the stdlib json module
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    orjson = None
+    json_loads = json.loads
+
+# PyArrow's multithreaded CSV writer is much faster than DataFrame.to_csv
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = None
+
 # Paths
 DATA_DIR = Path(__file__).parent / "data"
 RAW_JSON = DATA_DIR / "all_races_raw.json"
@@ -20,8 +36,7 @@ STATS_FILE = DATA_DIR / "full_data_stats.json"
 
 def load_wrangler_json(file_path):
     """Load JSON output from wrangler d1 execute"""
-    with open(file_path) as f:
-        data = json.load(f)
+    data = json_loads(Path(file_path).read_bytes())
 
     # Wrangler outputs array with results
     if isinstance(data, list) and len(data) > 0:
@@ -29,6 +44,34 @@ def load_wrangler_json(file_path):
             return data[0]['results']
     return []
 
+def write_csv(df, path):
+    """Write a DataFrame to CSV, using PyArrow when available"""
+    if pa is None:
+        df.to_csv(path, index=False)
+        return
+
+    # Keep pandas' datetime text (e.g. 2025-11-13 19:05:17+00:00) so downstream parsing is unchanged
+    dates = df.select_dtypes(include=['datetime', 'datetimetz']).columns
+    table = pa.Table.from_pandas(df.assign(**{col: df[col].astype(str) for col in dates}), preserve_index=False)
+    pa_csv.write_csv(table, path, pa_csv.WriteOptions(quoting_style='needed'))
+
+def write_json(data, path):
+    """Write indented JSON, using orjson (with native numpy scalar support) when available"""
+    if orjson is not None:
+        Path(path).write_bytes(
+            orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY, default=str)
+        )
+        return
+
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, default=str)
+
+def races_to_dataframe(races):
+    """Build the DataFrame column by column instead of inferring it row by row"""
+    if not races:
+        return pd.DataFrame()
+    return pd.DataFrame({key: [race.get(key) for race in races] for key in races[0]})
+
 def process_races():
     """Load and process ALL race data"""
     print("📊 Loading ALL race data (including parkruns)...")
@@ -37,7 +80,7 @@ def process_races():
     print(f"   Loaded {len(races)} total races")
 
     # Convert to DataFrame
-    df = pd.DataFrame(races)
+    df = races_to_dataframe(races)
 
     # WOOD-6: Extract coordinates from raw_response if available
     if 'raw_response' in df.columns:
@@ -48,7 +91,7 @@ def process_races():
         for idx, row in df.iterrows():
             if pd.notna(row.get('raw_response')):
                 try:
-                    data = json.loads(row['raw_response'])
+                    data = json_loads(row['raw_response'])
                     start_latlng = data.get('start_latlng', [])
                     end_latlng = data.get('end_latlng', [])
 
@@ -79,54 +122,85 @@ def process_races():
         print("   No raw_response column found - coordinates not available")
 
     # Parse date
-    df['date'] = pd.to_datetime(df['date'])
-    df['year'] = df['date'].dt.year
-    df['month'] = df['date'].dt.month
-    df['day_of_week'] = df['date'].dt.dayofweek  # 0=Monday, 5=Saturday, 6=Sunday
-    df['hour'] = df['date'].dt.hour
-    df['day_name'] = df['date'].dt.day_name()
+    df['date'] = pd.to_datetime(df['date'], format='ISO8601')
+    di = pd.DatetimeIndex(df['date'])  # one conversion, then plain array reads
+    df['year'] = di.year
+    df['month'] = di.month
+    df['day_of_week'] = di.dayofweek  # 0=Monday, 5=Saturday, 6=Sunday
+    df['hour'] = di.hour
+    df['day_name'] = di.day_name()
+
+    # Unit conversions are computed once and reused for pace
+    distance_km = df['final_distance'] / 1000
+    time_minutes = df['final_time'] / 60
 
     # Calculate pace (min/km)
-    df['pace_min_per_km'] = (df['final_time'] / 60) / (df['final_distance'] / 1000)
+    df['pace_min_per_km'] = time_minutes / distance_km
 
     # Create features for model
-    df['distance_km'] = df['final_distance'] / 1000
-    df['time_minutes'] = df['final_time'] / 60
+    df['distance_km'] = distance_km
+    df['time_minutes'] = time_minutes
 
     # Parkrun identification (already labeled in SQL, but verify)
     df['is_parkrun'] = df['is_parkrun'].astype(bool)
 
-    print(f"\n📈 Overall Statistics:")
-    print(f"   Total races: {len(df)}")
-    print(f"   Date range: {df['date'].min().date()} to {df['date'].max().date()}")
-    print(f"   Parkruns: {df['is_parkrun'].sum()} ({df['is_parkrun'].sum()/len(df)*100:.1f}%)")
-    print(f"   Non-parkruns: {(~df['is_parkrun']).sum()} ({(~df['is_parkrun']).sum()/len(df)*100:.1f}%)")
-    print(f"   With polylines: {df['has_polyline'].sum()} ({df['has_polyline'].sum()/len(df)*100:.1f}%)")
-
     # Parkrun analysis
     parkruns = df[df['is_parkrun']]
     non_parkruns = df[~df['is_parkrun']]
 
+    # Count everything once; the summaries and stats below only read these
+    polylines_by_group = df.groupby('is_parkrun')['has_polyline'].sum()
+    parkrun_polylines = polylines_by_group.get(True, 0)
+    non_parkrun_polylines = polylines_by_group.get(False, 0)
+    total_polylines = parkrun_polylines + non_parkrun_polylines
+    parkrun_count = len(parkruns)
+    non_parkrun_count = len(df) - parkrun_count
+
+    parkrun_day_counts = parkruns['day_name'].value_counts()
+    # Same as mode(): most frequent day, alphabetically first on ties
+    most_common_day = (
+        parkrun_day_counts[parkrun_day_counts == parkrun_day_counts.max()].index.min()
+        if len(parkruns) > 0 else None
+    )
+    event_counts = non_parkruns['event_name'].value_counts()
+
+    # Parkrun distance summary straight from the numpy array
+    parkrun_distances = parkruns['distance_km'].to_numpy(dtype=float)
+    parkrun_distances = parkrun_distances[~np.isnan(parkrun_distances)]
+    if len(parkrun_distances) > 0:
+        parkrun_avg_km = parkrun_distances.mean()
+        parkrun_std_km = parkrun_distances.std(ddof=1) if len(parkrun_distances) > 1 else np.nan
+        parkrun_min_km, parkrun_max_km = parkrun_distances.min(), parkrun_distances.max()
+    else:
+        parkrun_avg_km = parkrun_std_km = parkrun_min_km = parkrun_max_km = np.nan
+
+    print(f"\n📈 Overall Statistics:")
+    print(f"   Total races: {len(df)}")
+    print(f"   Date range: {df['date'].min().date()} to {df['date'].max().date()}")
+    print(f"   Parkruns: {parkrun_count} ({parkrun_count/len(df)*100:.1f}%)")
+    print(f"   Non-parkruns: {non_parkrun_count} ({non_parkrun_count/len(df)*100:.1f}%)")
+    print(f"   With polylines: {total_polylines} ({total_polylines/len(df)*100:.1f}%)")
+
     print(f"\n🏃 Parkrun Characteristics:")
     print(f"   Count: {len(parkruns)}")
-    print(f"   Avg distance: {parkruns['distance_km'].mean():.2f}km (±{parkruns['distance_km'].std():.2f}km)")
-    print(f"   Distance range: {parkruns['distance_km'].min():.2f}km - {parkruns['distance_km'].max():.2f}km")
-    print(f"   Most common day: {parkruns['day_name'].mode()[0] if len(parkruns) > 0 else 'N/A'}")
+    print(f"   Avg distance: {parkrun_avg_km:.2f}km (±{parkrun_std_km:.2f}km)")
+    print(f"   Distance range: {parkrun_min_km:.2f}km - {parkrun_max_km:.2f}km")
+    print(f"   Most common day: {most_common_day if most_common_day is not None else 'N/A'}")
     print(f"   Day distribution:")
-    for day, count in parkruns['day_name'].value_counts().items():
+    for day, count in parkrun_day_counts.items():
         print(f"     {day}: {count}")
     print(f"   Hour distribution:")
     for hour, count in parkruns['hour'].value_counts().sort_index().head(5).items():
         print(f"     {hour:02d}:00: {count}")
-    print(f"   With polylines: {parkruns['has_polyline'].sum()} ({parkruns['has_polyline'].sum()/len(parkruns)*100:.1f}%)")
+    print(f"   With polylines: {parkrun_polylines} ({parkrun_polylines/len(parkruns)*100:.1f}%)")
 
     print(f"\n🏁 Non-Parkrun (Events) Characteristics:")
     print(f"   Count: {len(non_parkruns)}")
-    print(f"   Unique events: {non_parkruns['event_name'].nunique()}")
+    print(f"   Unique events: {len(event_counts)}")
     print(f"   Top 10 events:")
-    for event, count in non_parkruns['event_name'].value_counts().head(10).items():
+    for event, count in event_counts.head(10).items():
         print(f"     {event}: {count}")
-    print(f"   With polylines: {non_parkruns['has_polyline'].sum()} ({non_parkruns['has_polyline'].sum()/len(non_parkruns)*100:.1f}%)")
+    print(f"   With polylines: {non_parkrun_polylines} ({non_parkrun_polylines/len(non_parkruns)*100:.1f}%)")
 
     # Distance distribution
     print(f"\n📏 Distance Distribution (All):")
@@ -136,9 +210,9 @@ def process_races():
     print(df['distance_category'].value_counts().sort_index())
 
     # Save datasets
-    df.to_csv(OUTPUT_CSV, index=False)
-    parkruns.to_csv(PARKRUN_CSV, index=False)
-    non_parkruns.to_csv(NON_PARKRUN_CSV, index=False)
+    write_csv(df, OUTPUT_CSV)
+    write_csv(parkruns, PARKRUN_CSV)
+    write_csv(non_parkruns, NON_PARKRUN_CSV)
 
     print(f"\n✅ Saved datasets:")
     print(f"   All races: {OUTPUT_CSV}")
@@ -149,23 +223,23 @@ def process_races():
     stats = {
         'total_races': len(df),
         'parkruns': {
-            'count': int(len(parkruns)),
-            'percentage': float(len(parkruns) / len(df) * 100),
-            'avg_distance_km': float(parkruns['distance_km'].mean()),
-            'std_distance_km': float(parkruns['distance_km'].std()),
-            'most_common_day': parkruns['day_name'].mode()[0] if len(parkruns) > 0 else None,
-            'day_distribution': parkruns['day_name'].value_counts().to_dict(),
-            'polyline_coverage_pct': float(parkruns['has_polyline'].sum() / len(parkruns) * 100) if len(parkruns) > 0 else 0
+            'count': int(parkrun_count),
+            'percentage': float(parkrun_count / len(df) * 100),
+            'avg_distance_km': float(parkrun_avg_km),
+            'std_distance_km': float(parkrun_std_km),
+            'most_common_day': most_common_day,
+            'day_distribution': parkrun_day_counts.to_dict(),
+            'polyline_coverage_pct': float(parkrun_polylines / len(parkruns) * 100) if len(parkruns) > 0 else 0
         },
         'non_parkruns': {
-            'count': int(len(non_parkruns)),
-            'percentage': float(len(non_parkruns) / len(df) * 100),
-            'unique_events': int(non_parkruns['event_name'].nunique()),
-            'top_events': non_parkruns['event_name'].value_counts().head(20).to_dict(),
-            'polyline_coverage_pct': float(non_parkruns['has_polyline'].sum() / len(non_parkruns) * 100)
+            'count': int(non_parkrun_count),
+            'percentage': float(non_parkrun_count / len(df) * 100),
+            'unique_events': int(len(event_counts)),
+            'top_events': event_counts.head(20).to_dict(),
+            'polyline_coverage_pct': float(non_parkrun_polylines / len(non_parkruns) * 100)
         },
         'overall': {
-            'polyline_coverage_pct': float(df['has_polyline'].sum() / len(df) * 100),
+            'polyline_coverage_pct': float(total_polylines / len(df) * 100),
             'date_range': {
                 'min': df['date'].min().isoformat(),
                 'max': df['date'].max().isoformat()
@@ -174,8 +248,7 @@ def process_races():
         }
     }
 
-    with open(STATS_FILE, 'w') as f:
-        json.dump(stats, f, indent=2, default=str)
+    write_json(stats, STATS_FILE)
 
     print(f"✅ Saved statistics to {STATS_FILE}")
 
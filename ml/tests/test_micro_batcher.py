@@ -0,0 +1,47 @@
+"""A bad row must fail only its own request, never the batcher task"""
+
+import asyncio
+import unittest
+
+import numpy as np
+
+from inference_api import MicroBatcher
+
+
+class SumModel:
+    """Stand-in model: 'probability' is the row sum"""
+
+    def predict_proba(self, X):
+        return X.sum(axis=1, keepdims=True)
+
+
+class MicroBatcherTest(unittest.TestCase):
+    def test_unconvertible_row_fails_only_its_request(self):
+        async def scenario():
+            batcher = MicroBatcher(SumModel(), num_features=2)
+            batcher.start()
+            try:
+                # Queued together, so they land in the same batch
+                results = await asyncio.wait_for(asyncio.gather(
+                    batcher.predict_proba((1, 2)),
+                    batcher.predict_proba((1, 10 ** 400)),  # int too large to convert to float
+                    batcher.predict_proba((3, 4)),
+                    return_exceptions=True,
+                ), timeout=5)
+
+                # The batcher is still serving afterwards
+                later = await asyncio.wait_for(batcher.predict_proba((5, 6)), timeout=5)
+            finally:
+                batcher.task.cancel()
+            return results, later
+
+        (good, bad, other), later = asyncio.run(scenario())
+
+        np.testing.assert_array_equal(good, [3])
+        self.assertIsInstance(bad, OverflowError)
+        np.testing.assert_array_equal(other, [7])
+        np.testing.assert_array_equal(later, [11])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+"""write_csv must fall back to pandas when PyArrow is not installed"""
+
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+import process_all_data
+import process_data
+
+
+class WriteCsvFallbackTest(unittest.TestCase):
+    def test_without_pyarrow(self):
+        df = pd.DataFrame({
+            'name': ['Bondi parkrun', 'City2Surf, 2024'],
+            'distance': [5000.0, 14000.0],
+            'date': pd.to_datetime(['2025-11-13 19:05:17+00:00', '2024-08-11 08:00:00+00:00']),
+        })
+
+        for module in (process_data, process_all_data):
+            with self.subTest(module=module.__name__), tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "out.csv"
+                with mock.patch.object(module, 'pa', None):
+                    module.write_csv(df, path)
+
+                pd.testing.assert_frame_equal(pd.read_csv(path), df.astype({'date': str}))
+
+
+if __name__ == "__main__":
+    unittest.main()
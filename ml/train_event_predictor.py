@@ -23,6 +23,7 @@ import numpy as np
 from pathlib import Path
 import json
 import pickle
+import warnings
 from datetime import datetime
 from collections import Counter
 
@@ -33,6 +34,8 @@ MODELS_DIR.mkdir(exist_ok=True)
 
 FEATURES_FILE = DATA_DIR / "event_predictor_features.csv"
 MODEL_FILE = MODELS_DIR / "event_predictor.pkl"
+BOOSTER_FILE = MODELS_DIR / "event_predictor.ubj"  # native XGBoost format, loadable with xgb.Booster(model_file=...)
+CLASSES_FILE = MODELS_DIR / "event_predictor_classes.npy"
 MODEL_METADATA = MODELS_DIR / "event_predictor_metadata.json"
 EVALUATION_REPORT = MODELS_DIR / "event_predictor_evaluation.txt"
 
@@ -42,13 +45,12 @@ MIN_SAMPLES_PER_CLASS = 3
 # Check dependencies
 try:
     import xgboost as xgb
-    from sklearn.model_selection import train_test_split
+    from sklearn.model_selection import StratifiedShuffleSplit
     from sklearn.metrics import (
         accuracy_score, precision_score, recall_score, f1_score,
-        classification_report, confusion_matrix, top_k_accuracy_score
+        precision_recall_fscore_support, confusion_matrix
     )
     from sklearn.preprocessing import LabelEncoder
-    from sklearn.utils.class_weight import compute_sample_weight
 except ImportError as e:
     print(f"❌ Missing dependency: {e}")
     print("\nInstall required packages:")
@@ -123,19 +125,18 @@ def prepare_training_data(df, event_counts):
     """
     print(f"\n🔧 Preparing training data...")
 
-    # Identify rare events
-    rare_events = event_counts[event_counts < MIN_SAMPLES_PER_CLASS].index.tolist()
+    # Identify rare events (Index for hash lookups, list for the JSON metadata)
+    rare_index = event_counts.index[event_counts < MIN_SAMPLES_PER_CLASS]
+    rare_events = rare_index.tolist()
 
-    # Create modified dataframe
-    df_prepared = df.copy()
-
-    # Group rare events
+    # Group rare events (only the label Series is rebuilt; feature columns are not copied)
+    event_names = df['event_name']
     if len(rare_events) > 0:
         print(f"   Grouping {len(rare_events)} rare events into 'rare_event' class")
-        df_prepared.loc[df_prepared['event_name'].isin(rare_events), 'event_name'] = 'rare_event'
+        event_names = event_names.where(~event_names.isin(rare_index), 'rare_event')
 
     # Get final class distribution
-    final_counts = df_prepared['event_name'].value_counts()
+    final_counts = event_names.value_counts()
     print(f"   Final classes: {len(final_counts)}")
     print(f"   Samples per class: {final_counts.min()} - {final_counts.max()}")
 
@@ -144,18 +145,26 @@ def prepare_training_data(df, event_counts):
     target_col = 'event_name'
 
     # Get feature columns
-    feature_cols = [col for col in df_prepared.columns
+    feature_cols = [col for col in df.columns
                    if col not in id_cols + [target_col]]
 
-    X = df_prepared[feature_cols]
-    y = df_prepared[target_col]
+    X = df[feature_cols]
+    y = event_names
 
     # Handle missing values
     X = X.fillna(0)
 
-    # Encode labels
+    # The model sees a float32 matrix (see __main__); refuse values that would overflow it
+    float_cols = X.select_dtypes(include='float').columns
+    if (X[float_cols].abs().max() > np.finfo(np.float32).max).any():
+        raise ValueError("Feature values out of float32 range")
+
+    # Encode labels with a hash-based factorization; categories come out sorted,
+    # so codes match LabelEncoder.fit_transform and the saved classes line up with them
+    categorical = pd.Categorical(y)
+    y_encoded = categorical.codes.astype(np.int32)
     label_encoder = LabelEncoder()
-    y_encoded = label_encoder.fit_transform(y)
+    label_encoder.classes_ = np.asarray(categorical.categories, dtype=object)
 
     print(f"\n   Features: {len(feature_cols)}")
     print(f"   Samples: {len(X)}")
@@ -164,6 +173,25 @@ def prepare_training_data(df, event_counts):
     return X, y, y_encoded, label_encoder, feature_cols, rare_events
 
 
+def training_device():
+    """Return 'cuda' if XGBoost was built with CUDA and a GPU is visible, else 'cpu'"""
+    if not xgb.build_info().get('USE_CUDA'):
+        return 'cpu'
+
+    # XGBoost falls back to CPU with only a warning when no GPU is found,
+    # so train a one-round probe and read back the device it actually used
+    probe = xgb.DMatrix(np.zeros((2, 1), dtype=np.float32), label=[0, 1])
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            booster = xgb.train({'device': 'cuda', 'tree_method': 'hist'}, probe, num_boost_round=1)
+    except xgb.core.XGBoostError:
+        return 'cpu'
+
+    device = json.loads(booster.save_config())['learner']['generic_param']['device']
+    return 'cuda' if device.startswith('cuda') else 'cpu'
+
+
 def train_model(X_train, y_train, X_test, y_test, num_classes):
     """
     Train XGBoost multi-class classifier
@@ -175,9 +203,15 @@ def train_model(X_train, y_train, X_test, y_test, num_classes):
     print(f"   Number of classes: {num_classes}")
 
     # Compute sample weights to handle class imbalance
-    sample_weights = compute_sample_weight('balanced', y_train)
+    # ('balanced': n_samples / (n_present_classes * class_count), one bincount + gather)
+    class_counts = np.bincount(y_train)
+    class_weights = len(y_train) / (np.count_nonzero(class_counts) * class_counts.clip(min=1))
+    sample_weights = class_weights[y_train].astype(np.float32)
     print(f"   Using balanced sample weights")
 
+    device = training_device()
+    print(f"   Training device: {device}")
+
     # XGBoost parameters for multi-class classification
     params = {
         'objective': 'multi:softprob',  # Multi-class with probabilities
@@ -191,6 +225,8 @@ def train_model(X_train, y_train, X_test, y_test, num_classes):
         'colsample_bytree': 0.8,
         'random_state': 42,
         'eval_metric': 'mlogloss',
+        'tree_method': 'hist',
+        'device': device,
     }
 
     model = xgb.XGBClassifier(**params)
@@ -198,6 +234,9 @@ def train_model(X_train, y_train, X_test, y_test, num_classes):
     # Train the model with sample weights
     model.fit(X_train, y_train, sample_weight=sample_weights, verbose=False)
 
+    # Evaluate and serve on CPU; the pickled model must not require a GPU
+    model.set_params(device='cpu')
+
     print(f"✅ Training complete!")
 
     return model
@@ -212,20 +251,25 @@ def evaluate_model(model, X_test, y_test, X_train, y_train, label_encoder):
     """
     print(f"\n📊 Evaluating model performance...")
 
-    # Predictions
-    y_pred = model.predict(X_test)
+    # Predictions (one pass per set: labels are the argmax of the softprob output)
     y_pred_proba = model.predict_proba(X_test)
+    y_pred = y_pred_proba.argmax(axis=1)
 
     # Train predictions (to check for overfitting)
-    y_train_pred = model.predict(X_train)
+    y_train_pred = model.predict_proba(X_train).argmax(axis=1)
 
     # Basic metrics
     test_accuracy = accuracy_score(y_test, y_pred)
     train_accuracy = accuracy_score(y_train, y_train_pred)
 
-    # Top-k accuracy (how often the correct answer is in top 3 predictions)
-    top3_accuracy = top_k_accuracy_score(y_test, y_pred_proba, k=3)
-    top5_accuracy = top_k_accuracy_score(y_test, y_pred_proba, k=5)
+    # Top-k accuracy (how often the correct answer is in top 3/5 predictions),
+    # from a single partition of the 5 most probable classes per row
+    k = min(5, y_pred_proba.shape[1])
+    top_k = np.argpartition(-y_pred_proba, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(y_pred_proba, top_k, axis=1), axis=1)
+    hits = np.take_along_axis(top_k, order, axis=1) == np.asarray(y_test)[:, None]
+    top3_accuracy = hits[:, :3].any(axis=1).mean()
+    top5_accuracy = hits.any(axis=1).mean()
 
     # Weighted metrics (to account for class imbalance)
     precision = precision_score(y_test, y_pred, average='weighted', zero_division=0)
@@ -283,25 +327,20 @@ def evaluate_model(model, X_test, y_test, X_train, y_train, label_encoder):
     print(f"PER-CLASS PERFORMANCE (Top 10 Events)")
     print(f"{'='*60}\n")
 
-    # Get classification report as dict
-    report = classification_report(
+    # Per-class metrics as arrays (one entry per encoded class)
+    class_precision, class_recall, class_f1, class_support = precision_recall_fscore_support(
         y_test, y_pred,
-        target_names=label_encoder.classes_,
-        output_dict=True,
+        labels=np.arange(len(label_encoder.classes_)),
         zero_division=0
     )
 
     # Sort by support (number of samples) and show top 10
-    class_reports = [(name, stats) for name, stats in report.items()
-                     if isinstance(name, str) and name not in ['accuracy', 'macro avg', 'weighted avg']]
-    class_reports.sort(key=lambda x: x[1]['support'], reverse=True)
-
-    for event_name, stats in class_reports[:10]:
-        print(f"{str(event_name):30s} | "
-              f"Precision: {stats['precision']:.3f} | "
-              f"Recall: {stats['recall']:.3f} | "
-              f"F1: {stats['f1-score']:.3f} | "
-              f"Samples: {int(stats['support'])}")
+    for i in np.argsort(-class_support, kind='stable')[:10]:
+        print(f"{str(label_encoder.classes_[i]):30s} | "
+              f"Precision: {class_precision[i]:.3f} | "
+              f"Recall: {class_recall[i]:.3f} | "
+              f"F1: {class_f1[i]:.3f} | "
+              f"Samples: {int(class_support[i])}")
 
     return metrics
 
@@ -312,37 +351,45 @@ def analyze_feature_importance(model, feature_names):
     print(f"FEATURE IMPORTANCE")
     print(f"{'='*60}\n")
 
-    # Get feature importance
+    # Get feature importance, sorted descending (stable, so ties keep feature order)
     importance = model.feature_importances_
-    feature_importance = pd.DataFrame({
-        'feature': feature_names,
-        'importance': importance
-    }).sort_values('importance', ascending=False)
+    order = np.argsort(-importance, kind='stable')
+    feature_importance = [
+        {'feature': feature_names[i], 'importance': float(importance[i])}
+        for i in order
+    ]
 
     # Top 15 features
     print("Top 15 Most Important Features:")
-    for idx, row in feature_importance.head(15).iterrows():
+    for row in feature_importance[:15]:
         bar_length = int(row['importance'] * 50)
         bar = '█' * bar_length
         print(f"  {row['feature']:30s} {bar} {row['importance']:.4f}")
 
-    return feature_importance.to_dict('records')
+    return feature_importance
 
 
 def save_model(model, metrics, feature_importance, feature_names, label_encoder, rare_events):
     """Save model and metadata"""
     print(f"\n💾 Saving model...")
 
-    # Save model
+    # Save model: only the booster, not the sklearn wrapper
     with open(MODEL_FILE, 'wb') as f:
-        pickle.dump(model, f)
+        pickle.dump(model.get_booster(), f)
     print(f"   ✅ Model saved: {MODEL_FILE}")
 
+    # Save the booster in XGBoost's binary UBJ format (no pickle, faster to load)
+    model.get_booster().save_model(str(BOOSTER_FILE))
+    print(f"   ✅ Booster saved: {BOOSTER_FILE}")
+
     # Save metadata
     metadata = {
         'model_type': 'event_name_predictor',
         'framework': 'xgboost',
         'version': '1.0.0',
+        'model_format': 'booster_pickle',
+        'booster_file': BOOSTER_FILE.name,
+        'classes_file': CLASSES_FILE.name,
         'trained_at': datetime.now().isoformat(),
         'metrics': {k: float(v) if isinstance(v, (int, float, np.number)) else v
                    for k, v in metrics.items()},
@@ -364,40 +411,42 @@ def save_model(model, metrics, feature_importance, feature_names, label_encoder,
     print(f"   ✅ Metadata saved: {MODEL_METADATA}")
 
     # Save label encoder separately
-    label_encoder_file = MODELS_DIR / "event_predictor_label_encoder.pkl"
-    with open(label_encoder_file, 'wb') as f:
-        pickle.dump(label_encoder, f)
-    print(f"   ✅ Label encoder saved: {label_encoder_file}")
+    # The encoder is just its classes_ array; store it as a plain string array
+    # (no pickle) and rebuild with LabelEncoder().classes_ = np.load(...)
+    np.save(CLASSES_FILE, label_encoder.classes_.astype(str))
+    print(f"   ✅ Label classes saved: {CLASSES_FILE}")
 
 
 def save_evaluation_report(metrics, feature_importance, label_encoder):
     """Save human-readable evaluation report"""
+    parts = [
+        "="*60 + "\n",
+        "EVENT NAME PREDICTOR - EVALUATION REPORT\n",
+        "="*60 + "\n\n",
+
+        f"Training Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n",
+        f"Number of Classes: {metrics['num_classes']}\n",
+        f"Event Classes: {', '.join(str(c) for c in label_encoder.classes_[:10])}...\n\n",
+
+        "-"*60 + "\n",
+        "TEST SET PERFORMANCE\n",
+        "-"*60 + "\n\n",
+        f"Top-1 Accuracy: {metrics['test_accuracy']:.4f}\n",
+        f"Top-3 Accuracy: {metrics['test_top3_accuracy']:.4f}\n",
+        f"Top-5 Accuracy: {metrics['test_top5_accuracy']:.4f}\n",
+        f"Precision:      {metrics['test_precision']:.4f}\n",
+        f"Recall:         {metrics['test_recall']:.4f}\n",
+        f"F1 Score:       {metrics['test_f1']:.4f}\n\n",
+
+        "-"*60 + "\n",
+        "FEATURE IMPORTANCE (Top 15)\n",
+        "-"*60 + "\n\n",
+    ]
+    parts += [f"{item['feature']:30s} {item['importance']:.4f}\n" for item in feature_importance[:15]]
+    parts.append("\n" + "="*60 + "\n")
+
     with open(EVALUATION_REPORT, 'w') as f:
-        f.write("="*60 + "\n")
-        f.write("EVENT NAME PREDICTOR - EVALUATION REPORT\n")
-        f.write("="*60 + "\n\n")
-
-        f.write(f"Training Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"Number of Classes: {metrics['num_classes']}\n")
-        f.write(f"Event Classes: {', '.join(str(c) for c in label_encoder.classes_[:10])}...\n\n")
-
-        f.write("-"*60 + "\n")
-        f.write("TEST SET PERFORMANCE\n")
-        f.write("-"*60 + "\n\n")
-        f.write(f"Top-1 Accuracy: {metrics['test_accuracy']:.4f}\n")
-        f.write(f"Top-3 Accuracy: {metrics['test_top3_accuracy']:.4f}\n")
-        f.write(f"Top-5 Accuracy: {metrics['test_top5_accuracy']:.4f}\n")
-        f.write(f"Precision:      {metrics['test_precision']:.4f}\n")
-        f.write(f"Recall:         {metrics['test_recall']:.4f}\n")
-        f.write(f"F1 Score:       {metrics['test_f1']:.4f}\n\n")
-
-        f.write("-"*60 + "\n")
-        f.write("FEATURE IMPORTANCE (Top 15)\n")
-        f.write("-"*60 + "\n\n")
-        for item in feature_importance[:15]:
-            f.write(f"{item['feature']:30s} {item['importance']:.4f}\n")
-
-        f.write("\n" + "="*60 + "\n")
+        f.write("".join(parts))
 
     print(f"   ✅ Evaluation report saved: {EVALUATION_REPORT}")
 
@@ -416,14 +465,18 @@ if __name__ == "__main__":
 
     # Split into train/test sets
     print("\n📊 Splitting data into train/test sets...")
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y_encoded, test_size=0.2, random_state=42, stratify=y_encoded
-    )
+    # Split on indices, then gather both sets from one float32 matrix (no DataFrame copies)
+    splitter = StratifiedShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+    (train_idx, test_idx), = splitter.split(np.zeros(len(y_encoded)), y_encoded)
+    X_arr = X.to_numpy(dtype=np.float32)
+    X_train, X_test = X_arr[train_idx], X_arr[test_idx]
+    y_train, y_test = y_encoded[train_idx], y_encoded[test_idx]
     print(f"   Train: {len(X_train)} samples")
     print(f"   Test:  {len(X_test)} samples")
 
     # Train model
     model = train_model(X_train, y_train, X_test, y_test, len(label_encoder.classes_))
+    model.get_booster().feature_names = feature_names  # trained on a bare array
 
     # Evaluate
     metrics = evaluate_model(model, X_test, y_test, X_train, y_train, label_encoder)
@@ -440,6 +493,8 @@ if __name__ == "__main__":
     print(f"{'='*60}")
     print(f"\nModel files:")
     print(f"  {MODEL_FILE}")
+    print(f"  {BOOSTER_FILE}")
+    print(f"  {CLASSES_FILE}")
     print(f"  {MODEL_METADATA}")
     print(f"  {EVALUATION_REPORT}")
     print(f"\nNext steps:")
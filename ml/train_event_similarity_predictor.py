@@ -26,11 +26,26 @@ import numpy as np
 from pathlib import Path
 import json
 import pickle
+from collections import namedtuple
 from datetime import datetime
-from math import radians, sin, cos, sqrt, atan2
+from math import radians, sin, cos, sqrt, atan2, isnan
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 
+# pandas' pyarrow CSV engine is multithreaded; fall back to the C parser without it
+try:
+    import pyarrow  # noqa: F401
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+# Numba compiles the single-query scoring loop; without it the loop runs as plain Python
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        return lambda func: func
+
 # Paths
 DATA_DIR = Path(__file__).parent / "data"
 MODELS_DIR = Path(__file__).parent / "models"
@@ -38,6 +53,8 @@ MODELS_DIR.mkdir(exist_ok=True)
 
 # WOOD-6: Load from source data with coordinates, not from feature-engineered CSV
 SOURCE_FILE = DATA_DIR / "non_parkrun_training.csv"
+# Only the columns extract_simple_features needs (skips e.g. the large raw_response JSON)
+SOURCE_COLUMNS = ['date', 'distance', 'start_lat', 'start_lng', 'event_name']
 MODEL_FILE = MODELS_DIR / "event_similarity_predictor.pkl"
 MODEL_METADATA = MODELS_DIR / "event_similarity_metadata.json"
 EVALUATION_REPORT = MODELS_DIR / "event_similarity_evaluation.txt"
@@ -46,6 +63,10 @@ EVALUATION_REPORT = MODELS_DIR / "event_similarity_evaluation.txt"
 MIN_SAMPLES_PER_EVENT = 3  # Events with fewer samples are ignored (focus on recurring events)
 DISTANCE_THRESHOLD = 0.40  # Normalized distance threshold for matching
 
+# Query record for EventSimilarityPredictor.predict; coordinates are optional
+FeatureVec = namedtuple('FeatureVec', 'day_of_year distance_km start_hour start_lat start_lng',
+                        defaults=(np.nan, np.nan))
+
 
 def haversine_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two coordinates in km using Haversine formula"""
@@ -62,6 +83,81 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     return R * c
 
 
+def haversine_matrix(lat1, lon1, lat2, lon2):
+    """
+    Vectorized Haversine distance in km
+
+    lat1/lon1 are shape (N, 1) and lat2/lon2 shape (1, K); returns an (N, K)
+    matrix. NaN coordinates give NaN distances.
+    """
+    R = 6371  # Earth radius in km
+
+    lat1, lon1, lat2, lon2 = map(np.radians, [lat1, lon1, lat2, lon2])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = np.sin(dlat/2)**2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
+
+    return R * c
+
+
+@njit(cache=True)
+def _sq_temporal(q_norm, centroid_norm, k):
+    """Squared normalized temporal distance between the query and centroid k"""
+    sq = 0.0
+    for j in range(q_norm.shape[0]):
+        diff = q_norm[j] - centroid_norm[k, j]
+        sq += diff * diff
+    return sq
+
+
+@njit(cache=True)
+def _score(q_norm, q_lat, q_lng, centroid_norm, centroid_lat, centroid_lng):
+    """
+    Find the nearest centroid for one normalized query
+
+    Same distance as custom_distance, computed in a single compiled pass over
+    the centroid arrays. Returns (index, distance); index is -1 if no
+    distance is finite.
+    """
+    nearest = -1
+    min_distance = np.inf
+
+    # Without query coordinates every distance is temporal-only: rank on squared
+    # distances and take a single sqrt for the winner
+    if isnan(q_lat) or isnan(q_lng):
+        for k in range(centroid_norm.shape[0]):
+            sq = _sq_temporal(q_norm, centroid_norm, k)
+            if sq < min_distance:
+                min_distance = sq
+                nearest = k
+        return nearest, sqrt(min_distance)
+
+    lat1 = radians(q_lat)
+    lon1 = radians(q_lng)
+
+    for k in range(centroid_norm.shape[0]):
+        dist = sqrt(_sq_temporal(q_norm, centroid_norm, k))
+
+        # Haversine (km), inlined; NaN if either side lacks coordinates
+        lat2 = radians(centroid_lat[k])
+        dlat = lat2 - lat1
+        dlon = radians(centroid_lng[k]) - lon1
+        a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
+        coord_dist = 6371 * 2 * atan2(sqrt(a), sqrt(1-a))
+
+        if not isnan(coord_dist):
+            dist = 0.5 * dist + 0.5 * coord_dist / 10.0
+
+        if dist < min_distance:
+            min_distance = dist
+            nearest = k
+
+    return nearest, min_distance
+
+
 def extract_simple_features(df):
     """
     Extract simplified features for event matching
@@ -75,34 +171,22 @@ def extract_simple_features(df):
     """
     print("🔧 Extracting simplified features...")
 
-    features = pd.DataFrame()
-
-    # Parse date if it's a string
-    if 'date' in df.columns:
-        dates = pd.to_datetime(df['date'])
-        features['day_of_year'] = dates.dt.dayofyear
-        features['start_hour'] = dates.dt.hour + dates.dt.minute / 60.0
-    else:
-        # Fallback to month-based approximation
-        month_to_day_of_year = {
-            1: 15, 2: 45, 3: 74, 4: 105, 5: 135, 6: 166,
-            7: 196, 8: 227, 9: 258, 10: 288, 11: 319, 12: 349
-        }
-        features['day_of_year'] = df['month'].map(month_to_day_of_year)
-        features['start_hour'] = df['hour'].astype(float)
-
-    # Distance - convert from meters to km if needed
-    if 'distance' in df.columns:
-        features['distance_km'] = df['distance'] / 1000.0
-    else:
-        features['distance_km'] = df['distance_km']
-
-    # Coordinates - now available from raw_response!
-    features['start_lat'] = df['start_lat']
-    features['start_lng'] = df['start_lng']
-
-    # Add event name for reference
-    features['event_name'] = df['event_name']
+    # Source rows always carry the full date and distance in meters (see SOURCE_COLUMNS)
+    dates = pd.DatetimeIndex(pd.to_datetime(df['date']))
+    day_of_year = dates.dayofyear.to_numpy()
+    start_hour = dates.hour.to_numpy() + dates.minute.to_numpy() / 60.0
+    distance_km = df['distance'].to_numpy() / 1000.0
+
+    # Build the frame in one go; coordinates are now available from raw_response,
+    # and event name is kept for reference
+    features = pd.DataFrame({
+        'day_of_year': day_of_year,
+        'start_hour': start_hour,
+        'distance_km': distance_km,
+        'start_lat': df['start_lat'],
+        'start_lng': df['start_lng'],
+        'event_name': df['event_name'],
+    }, index=df.index)
 
     print(f"   ✓ Extracted {len(features.columns)-1} features for {len(features)} activities")
 
@@ -126,20 +210,29 @@ def compute_event_centroids(features_df, min_samples=MIN_SAMPLES_PER_EVENT):
     event_counts = features_df['event_name'].value_counts()
     well_defined_events = event_counts[event_counts >= min_samples].index
 
-    centroids = {}
+    # Mean of each feature for every event in one groupby pass,
+    # reindexed to keep the most-common-first order
+    stats = features_df.groupby('event_name', sort=False).agg(
+        day_of_year=('day_of_year', 'mean'),
+        distance_km=('distance_km', 'mean'),
+        start_hour=('start_hour', 'mean'),
+        start_lat=('start_lat', 'mean'),
+        start_lng=('start_lng', 'mean'),
+        sample_count=('day_of_year', 'size'),
+        std_distance=('distance_km', 'std'),
+    ).loc[well_defined_events]
 
-    for event in well_defined_events:
-        event_data = features_df[features_df['event_name'] == event]
+    centroids = {}
 
-        # Compute mean of each feature
+    for event, row in zip(stats.index, stats.itertuples(index=False)):
         centroid = {
-            'day_of_year': event_data['day_of_year'].mean(),
-            'distance_km': event_data['distance_km'].mean(),
-            'start_hour': event_data['start_hour'].mean(),
-            'start_lat': event_data['start_lat'].mean() if not event_data['start_lat'].isna().all() else None,
-            'start_lng': event_data['start_lng'].mean() if not event_data['start_lng'].isna().all() else None,
-            'sample_count': len(event_data),
-            'std_distance': event_data['distance_km'].std(),
+            'day_of_year': row.day_of_year,
+            'distance_km': row.distance_km,
+            'start_hour': row.start_hour,
+            'start_lat': row.start_lat if not np.isnan(row.start_lat) else None,
+            'start_lng': row.start_lng if not np.isnan(row.start_lng) else None,
+            'sample_count': int(row.sample_count),
+            'std_distance': row.std_distance,
         }
 
         centroids[event] = centroid
@@ -168,15 +261,10 @@ def custom_distance(features1, features2, scaler):
     day1, dist1, hour1, lat1, lon1 = features1
     day2, dist2, hour2, lat2, lon2 = features2
 
-    # Normalize non-coordinate features
-    temporal_features1 = np.array([[day1, dist1, hour1]])
-    temporal_features2 = np.array([[day2, dist2, hour2]])
-
-    norm1 = scaler.transform(temporal_features1)[0]
-    norm2 = scaler.transform(temporal_features2)[0]
-
-    # Euclidean distance on normalized features
-    temporal_dist = np.sqrt(np.sum((norm1 - norm2) ** 2))
+    # Euclidean distance on normalized features; the scaler mean cancels in the
+    # difference, so only the per-feature scale is needed
+    diff = (np.array([day1, dist1, hour1]) - np.array([day2, dist2, hour2])) / scaler.scale_
+    temporal_dist = np.sqrt(np.sum(diff ** 2))
 
     # If coordinates available, add coordinate distance
     if not (np.isnan(lat1) or np.isnan(lat2)):
@@ -211,54 +299,71 @@ class EventSimilarityPredictor:
         self.centroids = compute_event_centroids(features_df)
 
         # Fit scaler on all temporal features
-        temporal_features = features_df[['day_of_year', 'distance_km', 'start_hour']].values
+        temporal_features = features_df[['day_of_year', 'distance_km', 'start_hour']].to_numpy(dtype=np.float32)
         self.scaler.fit(temporal_features)
+        self._build_cache()
 
         print(f"   ✓ Fitted scaler on {len(features_df)} activities")
         print(f"   ✓ Learned {len(self.centroids)} event centroids")
 
+    def _build_cache(self):
+        """Derive the float32 scoring arrays from the fitted scaler and centroids"""
+        # Plain float32 arrays so queries skip sklearn's transform() validation;
+        # the scoring path is float32 throughout (SGEMM, half the memory traffic)
+        self._mean = self.scaler.mean_.astype(np.float32)
+        self._scale = self.scaler.scale_.astype(np.float32)
+
+        # Centroids are fixed after fit: scale them once instead of on every query
+        centroids = list(self.centroids.values())
+        self._centroid_names = np.array(list(self.centroids), dtype=object)
+        self._centroid_norm = (
+            np.array([[c['day_of_year'], c['distance_km'], c['start_hour']] for c in centroids], dtype=np.float32) - self._mean
+        ) / self._scale
+        # Halved squared norms for the ||t||² + ||c||² - 2t·c identity in predict_batch
+        self._centroid_sqnorm = 0.5 * (self._centroid_norm ** 2).sum(axis=1)
+        # One contiguous array per coordinate (not a strided (K, 2) matrix);
+        # missing coordinates (None) become NaN
+        self._centroid_lat = np.array([c['start_lat'] for c in centroids], dtype=np.float32)
+        self._centroid_lng = np.array([c['start_lng'] for c in centroids], dtype=np.float32)
+
+    def __getstate__(self):
+        # Pickle only the fitted state; the scoring arrays are rebuilt on load
+        return {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._build_cache()
+
+    def _combine_distances(self, temporal_dist, coord_dist):
+        """Same weighting as custom_distance: 50% temporal, 50% spatial (10km scale)"""
+        return np.where(np.isnan(coord_dist), temporal_dist,
+                        0.5 * temporal_dist + 0.5 * coord_dist / 10.0)
+
     def predict(self, features):
         """
         Predict event for given features
 
         Args:
-            features: dict or Series with keys: day_of_year, distance_km, start_hour, start_lat, start_lng
+            features: FeatureVec, or dict/Series with keys: day_of_year, distance_km, start_hour, start_lat, start_lng
 
         Returns:
             (event_name, distance, confidence) or (None, distance, 0) if no match
         """
-        # Convert to tuple for distance calculation
-        feature_vector = (
-            features['day_of_year'],
-            features['distance_km'],
-            features['start_hour'],
-            features.get('start_lat', np.nan),
-            features.get('start_lng', np.nan)
-        )
-
-        # Find nearest centroid
-        min_distance = float('inf')
-        nearest_event = None
+        if not isinstance(features, FeatureVec):
+            features = FeatureVec(features['day_of_year'], features['distance_km'], features['start_hour'],
+                                  features.get('start_lat', np.nan), features.get('start_lng', np.nan))
 
-        for event_name, centroid in self.centroids.items():
-            centroid_vector = (
-                centroid['day_of_year'],
-                centroid['distance_km'],
-                centroid['start_hour'],
-                centroid.get('start_lat', np.nan),
-                centroid.get('start_lng', np.nan)
-            )
+        # One array for the whole record; missing coordinates (None) become NaN
+        values = np.array(features, dtype=np.float32)
+        q_norm = (values[:3] - self._mean) / self._scale
 
-            dist = custom_distance(feature_vector, centroid_vector, self.scaler)
-
-            if dist < min_distance:
-                min_distance = dist
-                nearest_event = event_name
+        nearest, min_distance = _score(q_norm, values[3], values[4],
+                                       self._centroid_norm, self._centroid_lat, self._centroid_lng)
 
         # Check if within threshold
         if min_distance <= self.distance_threshold:
             confidence = 1.0 - (min_distance / self.distance_threshold)
-            return nearest_event, min_distance, confidence
+            return self._centroid_names[nearest], min_distance, confidence
         else:
             return None, min_distance, 0.0
 
@@ -266,21 +371,40 @@ class EventSimilarityPredictor:
         """
         Predict events for a batch of activities
 
+        Builds the full (activities x centroids) distance matrix in one pass
+        rather than calling predict() row by row.
+
         Returns:
             DataFrame with predictions
         """
-        predictions = []
-
-        for idx, row in features_df.iterrows():
-            event, distance, confidence = self.predict(row)
-            predictions.append({
-                'predicted_event': event,
-                'distance': distance,
-                'confidence': confidence,
-                'actual_event': row.get('event_name', None)
-            })
-
-        return pd.DataFrame(predictions)
+        def column(name):
+            if name in features_df:
+                return features_df[name].to_numpy(dtype=np.float32)
+            return np.full(len(features_df), np.nan, dtype=np.float32)
+
+        # Normalized temporal distance for every (activity, centroid) pair
+        T = (features_df[['day_of_year', 'distance_km', 'start_hour']].to_numpy(dtype=np.float32) - self._mean) / self._scale
+        # ½||t - c||² = ½||t||² + ½||c||² - t·c, so every pair costs one GEMM entry
+        half_sq_dist = 0.5 * (T ** 2).sum(axis=1)[:, None] + self._centroid_sqnorm[None, :] - T @ self._centroid_norm.T
+        temporal_dist = np.sqrt(np.maximum(2 * half_sq_dist, 0))
+
+        # Coordinate distance where both sides have a start point
+        lat, lng = column('start_lat'), column('start_lng')
+        coord_dist = haversine_matrix(lat[:, None], lng[:, None],
+                                      self._centroid_lat[None, :], self._centroid_lng[None, :])
+
+        distances = self._combine_distances(temporal_dist, coord_dist)
+        # One reduction for the argmin; gather the matching distances instead of a second min pass
+        nearest = distances.argmin(axis=1)
+        min_distance = np.take_along_axis(distances, nearest[:, None], axis=1)[:, 0]
+        matched = min_distance <= self.distance_threshold
+
+        return pd.DataFrame({
+            'predicted_event': np.where(matched, self._centroid_names[nearest], None),
+            'distance': min_distance,
+            'confidence': np.where(matched, 1.0 - min_distance / self.distance_threshold, 0.0),
+            'actual_event': features_df['event_name'].to_numpy() if 'event_name' in features_df else None,
+        })
 
 
 def evaluate_model(predictor, test_features):
@@ -322,14 +446,12 @@ def evaluate_model(predictor, test_features):
     print(f"     Median distance: {predictions['distance'].median():.4f}")
     print(f"     Mean confidence: {predictions['confidence'].mean():.4f}")
 
-    # Per-event breakdown
+    # Per-event breakdown: one groupby pass instead of filtering once per event
     print(f"\n   Per-Event Breakdown:")
-    for event in known_events:
-        event_preds = test_known[test_known['actual_event'] == event]
-        if len(event_preds) > 0:
-            event_correct = (event_preds['predicted_event'] == event).sum()
-            event_acc = event_correct / len(event_preds)
-            print(f"     {event:30s} {event_correct}/{len(event_preds)} ({event_acc:.2%})")
+    per_event = (test_known['predicted_event'] == test_known['actual_event']).groupby(
+        test_known['actual_event']).agg(['sum', 'size'])
+    for event, event_correct, event_total in per_event.itertuples():
+        print(f"     {event:30s} {event_correct}/{event_total} ({event_correct / event_total:.2%})")
 
     return predictions
 
@@ -353,11 +475,12 @@ def save_model(predictor, predictions):
         'known_events': list(predictor.centroids.keys()),
         'distance_threshold': predictor.distance_threshold,
         'min_samples_per_event': MIN_SAMPLES_PER_EVENT,
+        # NaN isn't valid JSON: write it as null
         'centroids': {
-            name: {k: float(v) if isinstance(v, (int, float, np.number)) and not np.isnan(v) else None
+            name: {k: None if isinstance(v, (float, np.floating)) and np.isnan(v) else v
                    for k, v in centroid.items()}
             for name, centroid in predictor.centroids.items()
-        }
+        },
     }
 
     with open(MODEL_METADATA, 'w') as f:
@@ -371,7 +494,7 @@ if __name__ == "__main__":
 
     # Load data
     print("\n📊 Loading training data...")
-    df = pd.read_csv(SOURCE_FILE)
+    df = pd.read_csv(SOURCE_FILE, usecols=SOURCE_COLUMNS, engine=CSV_ENGINE)
     df = df[df['event_name'].notna()]  # Only labeled events
 
     # Exclude "Other" - it's a catch-all category, not a recurring event
@@ -391,11 +514,11 @@ if __name__ == "__main__":
     events_with_multiple = event_counts[event_counts >= 2].index
 
     if len(events_with_multiple) > 0:
-        # Create stratify labels (only for events with 2+ samples, None for others)
+        # Create stratify labels (only for events with 2+ samples, '_singleton' for others)
         stratify_labels = features['event_name'].where(
             features['event_name'].isin(events_with_multiple),
-            None
-        ).fillna('_singleton')  # Group all singletons together
+            '_singleton'  # Group all singletons together
+        )
 
         train_features, test_features = train_test_split(
             features, test_size=0.2, random_state=42, stratify=stratify_labels
@@ -18,7 +18,6 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import json
-import pickle
 from datetime import datetime
 
 # Paths
@@ -27,7 +26,7 @@ MODELS_DIR = Path(__file__).parent / "models"
 MODELS_DIR.mkdir(exist_ok=True)
 
 FEATURES_FILE = DATA_DIR / "parkrun_classifier_features.csv"
-MODEL_FILE = MODELS_DIR / "parkrun_classifier.pkl"
+MODEL_FILE = MODELS_DIR / "parkrun_classifier.ubj"
 MODEL_METADATA = MODELS_DIR / "parkrun_classifier_metadata.json"
 EVALUATION_REPORT = MODELS_DIR / "parkrun_classifier_evaluation.txt"
 
@@ -91,13 +90,17 @@ def prepare_training_data(df):
     return X, y, feature_cols
 
 
-def train_model(X_train, y_train, X_test, y_test):
+def make_dmatrix(X, y, feature_names):
+    """Build an XGBoost DMatrix from a feature frame (float32, named features)"""
+    return xgb.DMatrix(X.to_numpy(dtype=np.float32), label=y.to_numpy(), feature_names=feature_names)
+
+
+def train_model(dtrain):
     """
     Train XGBoost binary classifier
 
     Returns:
-        model: Trained XGBoost model
-        metrics: Dictionary of evaluation metrics
+        booster: Trained XGBoost booster
     """
     print("\n🚀 Training XGBoost binary classifier...")
 
@@ -106,26 +109,25 @@ def train_model(X_train, y_train, X_test, y_test):
         'objective': 'binary:logistic',
         'max_depth': 6,
         'learning_rate': 0.1,
-        'n_estimators': 100,
         'min_child_weight': 1,
         'gamma': 0,
         'subsample': 0.8,
         'colsample_bytree': 0.8,
-        'random_state': 42,
+        'seed': 42,
         'eval_metric': 'logloss',
+        'tree_method': 'hist',
+        'device': 'cpu',
     }
 
-    model = xgb.XGBClassifier(**params)
-
-    # Train the model
-    model.fit(X_train, y_train, verbose=False)
+    # Train the model (native API: the DMatrix is built once and reused for evaluation)
+    booster = xgb.train(params, dtrain, num_boost_round=100)
 
     print(f"✅ Training complete!")
 
-    return model
+    return booster
 
 
-def evaluate_model(model, X_test, y_test, X_train, y_train):
+def evaluate_model(booster, dtest, y_test, dtrain, y_train):
     """
     Comprehensive model evaluation
 
@@ -134,12 +136,12 @@ def evaluate_model(model, X_test, y_test, X_train, y_train):
     """
     print("\n📊 Evaluating model performance...")
 
-    # Predictions
-    y_pred = model.predict(X_test)
-    y_pred_proba = model.predict_proba(X_test)[:, 1]
+    # Predictions (binary:logistic outputs P(parkrun); threshold at 0.5 like XGBClassifier)
+    y_pred_proba = booster.predict(dtest)
+    y_pred = (y_pred_proba > 0.5).astype(int)
 
     # Train predictions (to check for overfitting)
-    y_train_pred = model.predict(X_train)
+    y_train_pred = (booster.predict(dtrain) > 0.5).astype(int)
 
     # Metrics
     metrics = {
@@ -190,42 +192,46 @@ def evaluate_model(model, X_test, y_test, X_train, y_train):
     return metrics
 
 
-def analyze_feature_importance(model, feature_names):
+def analyze_feature_importance(booster, feature_names):
     """Analyze and display feature importance"""
     print(f"\n{'='*60}")
     print(f"FEATURE IMPORTANCE")
     print(f"{'='*60}\n")
 
-    # Get feature importance
-    importance = model.feature_importances_
-    feature_importance = pd.DataFrame({
-        'feature': feature_names,
-        'importance': importance
-    }).sort_values('importance', ascending=False)
+    # Get feature importance (normalized gain, as XGBClassifier.feature_importances_),
+    # sorted descending (stable, so ties keep feature order)
+    score = booster.get_score(importance_type='gain')
+    importance = np.array([score.get(f, 0.0) for f in feature_names], dtype=np.float32)
+    importance /= importance.sum()
+    order = np.argsort(-importance, kind='stable')
+    feature_importance = [
+        {'feature': feature_names[i], 'importance': float(importance[i])}
+        for i in order
+    ]
 
     # Top 15 features
     print("Top 15 Most Important Features:")
-    for idx, row in feature_importance.head(15).iterrows():
+    for row in feature_importance[:15]:
         bar_length = int(row['importance'] * 50)
         bar = '█' * bar_length
         print(f"  {row['feature']:30s} {bar} {row['importance']:.4f}")
 
-    return feature_importance.to_dict('records')
+    return feature_importance
 
 
-def save_model(model, metrics, feature_importance, feature_names):
+def save_model(booster, metrics, feature_importance, feature_names):
     """Save model and metadata"""
     print(f"\n💾 Saving model...")
 
-    # Save model
-    with open(MODEL_FILE, 'wb') as f:
-        pickle.dump(model, f)
+    # Save booster in XGBoost's native UBJ format (load with xgb.Booster(model_file=...))
+    booster.save_model(str(MODEL_FILE))
     print(f"   ✅ Model saved: {MODEL_FILE}")
 
     # Save metadata
     metadata = {
         'model_type': 'parkrun_binary_classifier',
         'framework': 'xgboost',
+        'model_format': 'ubj',
         'version': '1.0.0',
         'trained_at': datetime.now().isoformat(),
         'metrics': {k: float(v) if isinstance(v, (int, float, np.number)) else v
@@ -294,17 +300,20 @@ if __name__ == "__main__":
     print(f"   Train: {len(X_train)} samples")
     print(f"   Test:  {len(X_test)} samples")
 
+    dtrain = make_dmatrix(X_train, y_train, feature_names)
+    dtest = make_dmatrix(X_test, y_test, feature_names)
+
     # Train model
-    model = train_model(X_train, y_train, X_test, y_test)
+    booster = train_model(dtrain)
 
     # Evaluate
-    metrics = evaluate_model(model, X_test, y_test, X_train, y_train)
+    metrics = evaluate_model(booster, dtest, y_test, dtrain, y_train)
 
     # Feature importance
-    feature_importance = analyze_feature_importance(model, feature_names)
+    feature_importance = analyze_feature_importance(booster, feature_names)
 
     # Save everything
-    save_model(model, metrics, feature_importance, feature_names)
+    save_model(booster, metrics, feature_importance, feature_names)
     save_evaluation_report(metrics, feature_importance, df)
 
     print(f"\n{'='*60}")
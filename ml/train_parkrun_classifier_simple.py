@@ -25,7 +25,6 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 import json
-import pickle
 from datetime import datetime
 
 # Paths
@@ -34,7 +33,8 @@ MODELS_DIR = Path(__file__).parent / "models"
 MODELS_DIR.mkdir(exist_ok=True)
 
 FEATURES_FILE = DATA_DIR / "parkrun_classifier_features.csv"
-MODEL_FILE = MODELS_DIR / "parkrun_classifier_simple.pkl"
+FEATURES_CACHE = FEATURES_FILE.with_suffix(".parquet")  # binary copy of the CSV, rebuilt when the CSV changes
+MODEL_FILE = MODELS_DIR / "parkrun_classifier_simple.ubj"  # native XGBoost format, load with XGBClassifier().load_model(...)
 MODEL_METADATA = MODELS_DIR / "parkrun_classifier_simple_metadata.json"
 EVALUATION_REPORT = MODELS_DIR / "parkrun_classifier_simple_evaluation.txt"
 
@@ -52,14 +52,21 @@ SELECTED_FEATURES = [
     'day_5',
 ]
 
+# Histogram bins per feature: plenty for 10 mostly integer-valued features
+MAX_BIN = 64
+
+# Parquet needs PyArrow; without it the features are always parsed from CSV
+try:
+    import pyarrow  # noqa: F401
+    HAVE_PYARROW = True
+except ImportError:
+    HAVE_PYARROW = False
+
 # Check dependencies
 try:
     import xgboost as xgb
     from sklearn.model_selection import train_test_split
-    from sklearn.metrics import (
-        accuracy_score, precision_score, recall_score, f1_score,
-        confusion_matrix, classification_report, roc_auc_score
-    )
+    from sklearn.metrics import confusion_matrix, classification_report, roc_auc_score
 except ImportError as e:
     print(f"❌ Missing dependency: {e}")
     exit(1)
@@ -69,7 +76,13 @@ def load_features():
     """Load and prepare feature data"""
     print("📊 Loading feature data...")
 
-    df = pd.read_csv(FEATURES_FILE)
+    if HAVE_PYARROW and FEATURES_CACHE.exists() and FEATURES_CACHE.stat().st_mtime >= FEATURES_FILE.stat().st_mtime:
+        df = pd.read_parquet(FEATURES_CACHE, engine='pyarrow')
+    else:
+        df = pd.read_csv(FEATURES_FILE)
+        if HAVE_PYARROW:
+            df.to_parquet(FEATURES_CACHE, engine='pyarrow', index=False)
+            print(f"   Cached features: {FEATURES_CACHE}")
     print(f"   Loaded {len(df)} records")
     print(f"   Parkruns: {df['is_parkrun'].sum()}")
     print(f"   Non-parkruns: {(~df['is_parkrun']).sum()}")
@@ -83,13 +96,14 @@ def prepare_training_data(df):
     Uses ONLY the top 10 most important features
 
     Returns:
-        X: Feature matrix (only 10 features!)
+        X: Feature matrix (only 10 features!), contiguous float32
         y: Target labels (1 = parkrun, 0 = not parkrun)
     """
     print(f"\n🔧 Preparing training data (SIMPLIFIED)...")
 
     # Select ONLY the important features
-    X = df[SELECTED_FEATURES].fillna(0)
+    # float32 is what XGBoost stores internally, so fit/predict don't copy it again
+    X = np.ascontiguousarray(df[SELECTED_FEATURES].fillna(0).to_numpy(dtype=np.float32))
     y = df['is_parkrun'].astype(int)
 
     print(f"   Features: {len(SELECTED_FEATURES)} (trimmed from 32!)")
@@ -100,7 +114,7 @@ def prepare_training_data(df):
     return X, y
 
 
-def train_model(X_train, y_train):
+def train_model(dtrain):
     """Train XGBoost binary classifier (simpler params)"""
     print(f"\n🚀 Training simplified XGBoost classifier...")
 
@@ -109,42 +123,47 @@ def train_model(X_train, y_train):
         'objective': 'binary:logistic',
         'max_depth': 4,  # Reduced from 6
         'learning_rate': 0.1,
-        'n_estimators': 50,  # Reduced from 100
         'min_child_weight': 1,
         'subsample': 0.8,
         'colsample_bytree': 0.8,
-        'random_state': 42,
+        'seed': 42,
         'eval_metric': 'logloss',
+        'tree_method': 'hist',  # histogram split finding
+        'max_bin': MAX_BIN,
+        'nthread': -1,  # all cores
     }
 
-    model = xgb.XGBClassifier(**params)
-    model.fit(X_train, y_train, verbose=False)
+    booster = xgb.train(params, dtrain, num_boost_round=50)  # Reduced from 100
 
     print(f"✅ Training complete!")
 
-    return model
+    return booster
 
 
-def evaluate_model(model, X_test, y_test, X_train, y_train):
+def evaluate_model(booster, dtest, y_test, dtrain, y_train):
     """Comprehensive model evaluation"""
     print(f"\n📊 Evaluating model performance...")
 
-    # Predictions
-    y_pred = model.predict(X_test)
-    y_pred_proba = model.predict_proba(X_test)[:, 1]
+    # Predictions: one pass for P(parkrun), thresholded at 0.5 like XGBClassifier.predict
+    y_pred_proba = booster.predict(dtest)
+    y_pred = (y_pred_proba > 0.5).astype(int)
 
     # Train predictions
-    y_train_pred = model.predict(X_train)
+    y_train_pred = (booster.predict(dtrain) > 0.5).astype(int)
 
-    # Metrics
+    # Metrics: accuracy/precision/recall/F1 all follow from one confusion matrix
+    cm = confusion_matrix(y_test, y_pred, labels=[0, 1])
+    tn, fp, fn, tp = cm.ravel()
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
     metrics = {
-        'test_accuracy': accuracy_score(y_test, y_pred),
-        'test_precision': precision_score(y_test, y_pred),
-        'test_recall': recall_score(y_test, y_pred),
-        'test_f1': f1_score(y_test, y_pred),
+        'test_accuracy': (tp + tn) / cm.sum(),
+        'test_precision': precision,
+        'test_recall': recall,
+        'test_f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
         'test_roc_auc': roc_auc_score(y_test, y_pred_proba),
-        'train_accuracy': accuracy_score(y_train, y_train_pred),
-        'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
+        'train_accuracy': float(np.mean(y_train_pred == y_train)),
+        'confusion_matrix': cm,  # ndarray; converted to a list in save_model
         'num_features': len(SELECTED_FEATURES),
     }
 
@@ -170,11 +189,10 @@ def evaluate_model(model, X_test, y_test, X_train, y_train):
         print(f"  ✅ Good generalization")
 
     print(f"\nConfusion Matrix:")
-    cm = metrics['confusion_matrix']
     print(f"                Predicted")
     print(f"               Not PR | Parkrun")
-    print(f"Actual Not PR:   {cm[0][0]:4d} | {cm[0][1]:4d}")
-    print(f"Actual Parkrun:  {cm[1][0]:4d} | {cm[1][1]:4d}")
+    print(f"Actual Not PR:   {cm[0, 0]:4d} | {cm[0, 1]:4d}")
+    print(f"Actual Parkrun:  {cm[1, 0]:4d} | {cm[1, 1]:4d}")
 
     print(f"\nClassification Report:")
     print(classification_report(y_test, y_pred, target_names=['Not Parkrun', 'Parkrun']))
@@ -182,39 +200,45 @@ def evaluate_model(model, X_test, y_test, X_train, y_train):
     return metrics
 
 
-def analyze_feature_importance(model):
+def analyze_feature_importance(booster):
     """Analyze feature importance"""
     print(f"\n{'='*60}")
     print(f"FEATURE IMPORTANCE (ALL 10 FEATURES)")
     print(f"{'='*60}\n")
 
-    importance = model.feature_importances_
-    feature_importance = pd.DataFrame({
-        'feature': SELECTED_FEATURES,
-        'importance': importance
-    }).sort_values('importance', ascending=False)
-
-    for idx, row in feature_importance.iterrows():
+    # Normalized gain, as XGBClassifier.feature_importances_,
+    # sorted descending (stable, so ties keep feature order)
+    score = booster.get_score(importance_type='gain')
+    importance = np.array([score.get(f, 0.0) for f in SELECTED_FEATURES], dtype=np.float32)
+    importance /= importance.sum()
+    order = np.argsort(-importance, kind='stable')
+    feature_importance = [
+        {'feature': SELECTED_FEATURES[i], 'importance': float(importance[i])}
+        for i in order
+    ]
+
+    for row in feature_importance:
         bar_length = int(row['importance'] * 50)
         bar = '█' * bar_length
         print(f"  {row['feature']:30s} {bar} {row['importance']:.4f}")
 
-    return feature_importance.to_dict('records')
+    return feature_importance
 
 
-def save_model(model, metrics, feature_importance):
+def save_model(booster, metrics, feature_importance):
     """Save model and metadata"""
     print(f"\n💾 Saving simplified model...")
 
-    # Save model
-    with open(MODEL_FILE, 'wb') as f:
-        pickle.dump(model, f)
+    # Save model in XGBoost's native UBJ format (compact, no pickle)
+    booster.save_model(str(MODEL_FILE))
     print(f"   ✅ Model saved: {MODEL_FILE}")
 
-    # Save metadata
+    # Save metadata (the confusion matrix is kept as an ndarray until here)
+    metrics = {**metrics, 'confusion_matrix': metrics['confusion_matrix'].tolist()}
     metadata = {
         'model_type': 'parkrun_binary_classifier_simple',
         'framework': 'xgboost',
+        'model_format': 'ubj',
         'version': '2.0.0',
         'trained_at': datetime.now().isoformat(),
         'metrics': {k: float(v) if isinstance(v, (int, float, np.number)) else v
@@ -278,17 +302,21 @@ if __name__ == "__main__":
     print(f"   Train: {len(X_train)} samples")
     print(f"   Test:  {len(X_test)} samples")
 
+    # Quantize once; the test matrix reuses the training bin cuts
+    dtrain = xgb.QuantileDMatrix(X_train, label=y_train, feature_names=SELECTED_FEATURES, max_bin=MAX_BIN)
+    dtest = xgb.QuantileDMatrix(X_test, label=y_test, feature_names=SELECTED_FEATURES, max_bin=MAX_BIN, ref=dtrain)
+
     # Train
-    model = train_model(X_train, y_train)
+    booster = train_model(dtrain)
 
     # Evaluate
-    metrics = evaluate_model(model, X_test, y_test, X_train, y_train)
+    metrics = evaluate_model(booster, dtest, y_test, dtrain, y_train)
 
     # Feature importance
-    feature_importance = analyze_feature_importance(model)
+    feature_importance = analyze_feature_importance(booster)
 
     # Save
-    save_model(model, metrics, feature_importance)
+    save_model(booster, metrics, feature_importance)
     save_evaluation_report(metrics, feature_importance)
 
     print(f"\n{'='*60}")